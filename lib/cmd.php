@@ -15,6 +15,17 @@ function getCmdOpt($aArg, $aSpec, &$aResult, $bExitOnError = false, $bExitOnUnkn
         }
     }
 
+    // Options may also be given in the form '--name=value'.
+    $aSplitArg = array();
+    foreach ($aArg as $sArg) {
+        if (substr($sArg, 0, 2) == '--' && strpos($sArg, '=') !== false) {
+            $aSplitArg = array_merge($aSplitArg, explode('=', $sArg, 2));
+        } else {
+            $aSplitArg[] = $sArg;
+        }
+    }
+    $aArg = $aSplitArg;
+
     $aResult = array();
     $bUnknown = false;
     $iSize = count($aArg);
@@ -0,0 +1,18 @@
+"""
+Subcommand definitions for the command-line tool.
+
+Each module implements one or more subcommands as classes with two
+functions: add_args() adds the CLI parameters for the subcommand, run()
+executes it. The class documentation doubles as the help text for the
+command. The first line is also used in the summary when calling the
+program without a subcommand.
+
+The modules are only imported when their subcommand is needed, see
+nominatim.cli for the list of available commands.
+
+add_args() and run() are not documented, because the class documentation
+already describes the command, so the modules disable C0111. Helper
+modules like exec_utils or the indexer are imported inside run(), so that
+building the parsers, e.g. for `nominatim --help`, does not load them.
+Therefore the modules also disable C0415.
+"""
@@ -0,0 +1,58 @@
+"""
+Implementation of the 'add-data' subcommand.
+"""
+import os
+
+from .args import flag_params
+
+# pylint: disable=C0111,C0415
+
+_ADD_DATA_FLAGS = (
+    ('file', '--import-file', True),
+    ('diff', '--import-diff', True),
+    ('node', '--import-node', True),
+    ('way', '--import-way', True),
+    ('relation', '--import-relation', True),
+    ('use_main_api', '--use-main-api', False)
+)
+
+class UpdateAddData:
+    """\
+    Add additional data from a file or an online source.
+
+    Data is only imported, not indexed. You need to call `nominatim-update index`
+    to complete the process.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group_name = parser.add_argument_group('Source')
+        group = group_name.add_mutually_exclusive_group(required=True)
+        group.add_argument('--file', metavar='FILE',
+                           help='Import data from an OSM file')
+        group.add_argument('--diff', metavar='FILE',
+                           help='Import data from an OSM diff file')
+        group.add_argument('--node', metavar='ID', type=int,
+                           help='Import a single node from the API')
+        group.add_argument('--way', metavar='ID', type=int,
+                           help='Import a single way from the API')
+        group.add_argument('--relation', metavar='ID', type=int,
+                           help='Import a single relation from the API')
+        group.add_argument('--tiger-data', metavar='DIR',
+                           help='Add housenumbers from the US TIGER census database.')
+        group = parser.add_argument_group('Extra arguments')
+        group.add_argument('--use-main-api', action='store_true',
+                           help='Use OSM API instead of Overpass to download objects')
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        if args.tiger_data:
+            os.environ['NOMINATIM_TIGER_DATA_PATH'] = args.tiger_data
+            return exec_utils.run_legacy_script('setup.php', '--import-tiger-data',
+                                                nominatim_env=args)
+
+        # The source arguments are mutually exclusive, so at most one is set.
+        params = ['update.php'] + flag_params(args, _ADD_DATA_FLAGS)
+        return exec_utils.run_legacy_script(*params, nominatim_env=args)
@@ -0,0 +1,47 @@
+"""
+Implementation of the 'check-database' and 'warm' subcommands.
+"""
+
+# pylint: disable=C0111,C0415
+
+class AdminCheckDatabase:
+    """\
+    Check that the database is complete and operational.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        pass # No options
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        return exec_utils.run_legacy_script_exec('check_import_finished.php', nominatim_env=args)
+
+
+class AdminWarm:
+    """\
+    Warm database caches for search and reverse queries.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Target arguments')
+        group.add_argument('--search-only', action='store_const', dest='target',
+                           const='search',
+                           help="Only pre-warm tables for search queries")
+        group.add_argument('--reverse-only', action='store_const', dest='target',
+                           const='reverse',
+                           help="Only pre-warm tables for reverse queries")
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = ['warm.php']
+        if args.target == 'reverse':
+            params.append('--reverse-only')
+        if args.target == 'search':
+            params.append('--search-only')
+        return exec_utils.run_legacy_script_exec(*params, nominatim_env=args)
@@ -0,0 +1,266 @@
+"""
+Subcommands that run queries against the API scripts.
+"""
+import argparse
+import operator
+
+from .args import ChoiceType
+
+# pylint: disable=C0111,C0415
+
+STRUCTURED_QUERY = (
+    ('street', 'housenumber and street'),
+    ('city', 'city, town or village'),
+    ('county', 'county'),
+    ('state', 'state'),
+    ('country', 'country'),
+    ('postalcode', 'postcode')
+)
+
+EXTRADATA_PARAMS = (
+    ('addressdetails', 'Include a breakdown of the address into elements.'),
+    ('extratags', """Include additional information if available
+                     (e.g. wikipedia link, opening hours)."""),
+    ('namedetails', 'Include a list of alternative names.')
+)
+
+DETAILS_SWITCHES = (
+    ('addressdetails', 'Include a breakdown of the address into elements.'),
+    ('keywords', 'Include a list of name keywords and address keywords.'),
+    ('linkedplaces', 'Include a details of places that are linked with this one.'),
+    ('hierarchy', 'Include details of places lower in the address hierarchy.'),
+    ('group_hierarchy', 'Group the places by type.'),
+    ('polygon_geojson', 'Include geometry of result.')
+)
+
+
+_STRUCTURED_NAMES = tuple(name for name, _ in STRUCTURED_QUERY)
+_DETAILS_SWITCH_NAMES = tuple(name for name, _ in DETAILS_SWITCHES)
+_get_details_switches = operator.attrgetter(*_DETAILS_SWITCH_NAMES)
+_OSM_TYPE_MAP = (('node', 'N'), ('way', 'W'), ('relation', 'R'))
+
+# Option strings and help texts of the tabled arguments, prepared at import.
+_STRUCTURED_OPTIONS = tuple(('--' + name, 'Structured query: ' + desc)
+                            for name, desc in STRUCTURED_QUERY)
+_EXTRADATA_OPTIONS = tuple(('--' + name, desc) for name, desc in EXTRADATA_PARAMS)
+_DETAILS_OPTIONS = tuple(('--' + name, desc) for name, desc in DETAILS_SWITCHES)
+
+# Arguments of the API commands that are handed on as query parameters.
+# Unless listed in _CLI_TO_API, the parameter has the name of the argument.
+_API_KEYS = frozenset(_STRUCTURED_NAMES + tuple(name for name, _ in EXTRADATA_PARAMS)
+                      + ('query', 'format', 'lang', 'polygon_output', 'polygon_threshold',
+                         'countrycodes', 'exclude_place_ids', 'limit', 'viewbox',
+                         'bounded', 'dedupe', 'lat', 'lon', 'zoom'))
+_CLI_TO_API = {'query': 'q', 'lang': 'accept-language'}
+
+
+def _api_params(args):
+    """ Collect the query parameters for an API call from the parsed
+        arguments. Optional arguments default to argparse.SUPPRESS,
+        so only the ones given on the command line show up here.
+    """
+    params = {_CLI_TO_API.get(k, k): ('1' if v is True else '0' if v is False else v)
+              for k, v in vars(args).items() if k in _API_KEYS}
+
+    if 'polygon_output' in params:
+        params['polygon_' + params.pop('polygon_output')] = '1'
+
+    return params
+
+
+_API_FORMATS = ChoiceType('xml', 'json', 'jsonv2', 'geojson', 'geocodejson')
+_POLYGON_FORMATS = ChoiceType('geojson', 'kml', 'svg', 'text')
+_STATUS_FORMATS = ChoiceType('text', 'json')
+
+def _add_api_output_arguments(parser):
+    group = parser.add_argument_group('Output arguments')
+    group.add_argument('--format', default='jsonv2',
+                       type=_API_FORMATS, metavar=_API_FORMATS.metavar,
+                       help='Format of result')
+    for option, desc in _EXTRADATA_OPTIONS:
+        group.add_argument(option, action='store_true',
+                           default=argparse.SUPPRESS, help=desc)
+
+    group.add_argument('--lang', '--accept-language', metavar='LANGS',
+                       default=argparse.SUPPRESS,
+                       help='Preferred language order for presenting search results')
+    group.add_argument('--polygon-output', default=argparse.SUPPRESS,
+                       type=_POLYGON_FORMATS, metavar=_POLYGON_FORMATS.metavar,
+                       help='Output geometry of results as a GeoJSON, KML, SVG or WKT.')
+    group.add_argument('--polygon-threshold', type=float, metavar='TOLERANCE',
+                       default=argparse.SUPPRESS,
+                       help="""Simplify output geometry.
+                               Parameter is difference tolerance in degrees.""")
+
+
+class APISearch:
+    """\
+    Execute API search query.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Query arguments')
+        group.add_argument('--query', default=argparse.SUPPRESS,
+                           help='Free-form query string')
+        for option, desc in _STRUCTURED_OPTIONS:
+            group.add_argument(option, default=argparse.SUPPRESS, help=desc)
+
+        _add_api_output_arguments(parser)
+
+        group = parser.add_argument_group('Result limitation')
+        group.add_argument('--countrycodes', metavar='CC,..', default=argparse.SUPPRESS,
+                           help='Limit search results to one or more countries.')
+        group.add_argument('--exclude_place_ids', metavar='ID,..', default=argparse.SUPPRESS,
+                           help='List of search object to be excluded')
+        group.add_argument('--limit', type=int, default=argparse.SUPPRESS,
+                           help='Limit the number of returned results')
+        group.add_argument('--viewbox', metavar='X1,Y1,X2,Y2', default=argparse.SUPPRESS,
+                           help='Preferred area to find search results')
+        group.add_argument('--bounded', action='store_true', default=argparse.SUPPRESS,
+                           help='Strictly restrict results to viewbox area')
+
+        group = parser.add_argument_group('Other arguments')
+        group.add_argument('--no-dedupe', action='store_false', dest='dedupe',
+                           default=argparse.SUPPRESS,
+                           help='Do not remove duplicates from the result list')
+
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = _api_params(args)
+        if 'q' in params:
+            # A free-form query takes precedence over a structured one.
+            for name in _STRUCTURED_NAMES:
+                params.pop(name, None)
+
+        return exec_utils.run_api_script('search', args.project_dir,
+                                          phpcgi_bin=args.phpcgi_path, params=params,
+                                          fastcgi=args.config.get_bool('FASTCGI'))
+
+class APIReverse:
+    """\
+    Execute API reverse query.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Query arguments')
+        group.add_argument('--lat', type=float, required=True,
+                           help='Latitude of coordinate to look up (in WGS84)')
+        group.add_argument('--lon', type=float, required=True,
+                           help='Longitude of coordinate to look up (in WGS84)')
+        group.add_argument('--zoom', type=int, default=argparse.SUPPRESS,
+                           help='Level of detail required for the address')
+
+        _add_api_output_arguments(parser)
+
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = _api_params(args)
+
+        return exec_utils.run_api_script('reverse', args.project_dir,
+                                          phpcgi_bin=args.phpcgi_path, params=params,
+                                          fastcgi=args.config.get_bool('FASTCGI'))
+
+
+class APILookup:
+    """\
+    Execute API reverse query.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Query arguments')
+        group.add_argument('--id', metavar='OSMID',
+                           action='append', required=True, dest='ids',
+                           help='OSM id to lookup in format <NRW><id> (may be repeated)')
+
+        _add_api_output_arguments(parser)
+
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = _api_params(args)
+        params['osm_ids'] = ','.join(args.ids)
+
+        return exec_utils.run_api_script('lookup', args.project_dir,
+                                          phpcgi_bin=args.phpcgi_path, params=params,
+                                          fastcgi=args.config.get_bool('FASTCGI'))
+
+
+class APIDetails:
+    """\
+    Execute API lookup query.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Query arguments')
+        objs = group.add_mutually_exclusive_group(required=True)
+        objs.add_argument('--node', '-n', type=int,
+                          help="Look up the OSM node with the given ID.")
+        objs.add_argument('--way', '-w', type=int,
+                          help="Look up the OSM way with the given ID.")
+        objs.add_argument('--relation', '-r', type=int,
+                          help="Look up the OSM relation with the given ID.")
+        objs.add_argument('--place_id', '-p', type=int,
+                          help='Database internal identifier of the OSM object to look up.')
+        group.add_argument('--class', dest='object_class',
+                           help="""Class type to disambiguated multiple entries
+                                   of the same object.""")
+
+        group = parser.add_argument_group('Output arguments')
+        for option, desc in _DETAILS_OPTIONS:
+            group.add_argument(option, action='store_true', help=desc)
+        group.add_argument('--lang', '--accept-language', metavar='LANGS',
+                           help='Preferred language order for presenting search results')
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        for attr, osmtype in _OSM_TYPE_MAP:
+            osmid = getattr(args, attr)
+            if osmid:
+                params = {'osmtype': osmtype, 'osmid': osmid}
+                break
+        else:
+            params = {'place_id': args.place_id}
+        if args.object_class:
+            params['class'] = args.object_class
+        params.update(zip(_DETAILS_SWITCH_NAMES,
+                          ('1' if value else '0' for value in _get_details_switches(args))))
+
+        return exec_utils.run_api_script('details', args.project_dir,
+                                          phpcgi_bin=args.phpcgi_path, params=params,
+                                          fastcgi=args.config.get_bool('FASTCGI'))
+
+
+class APIStatus:
+    """\
+    Execute API status query.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('API parameters')
+        group.add_argument('--format', default='text',
+                           type=_STATUS_FORMATS, metavar=_STATUS_FORMATS.metavar,
+                           help='Format of result')
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        return exec_utils.run_api_script('status', args.project_dir,
+                                          phpcgi_bin=args.phpcgi_path,
+                                          params={'format': args.format},
+                                          fastcgi=args.config.get_bool('FASTCGI'))
@@ -0,0 +1,40 @@
+"""
+Helpers for defining the arguments of subcommands.
+"""
+import argparse
+
+class ChoiceType: # pylint: disable=R0903
+    """ Argument type that only accepts one of the given values.
+
+        Replacement for the `choices` parameter of argparse which looks
+        the value up in a frozenset instead of scanning a list. The
+        original order is kept for the help text and error messages,
+        which look the same as the ones from argparse.
+
+        Create instances once at module level and share them between all
+        arguments that accept the same values.
+    """
+
+    def __init__(self, *choices):
+        self.choices = choices
+        self.lookup = frozenset(choices)
+        self.metavar = '{' + ','.join(choices) + '}'
+
+    def __call__(self, value):
+        if value not in self.lookup:
+            raise argparse.ArgumentTypeError(
+                'invalid choice: {!r} (choose from {})'.format(
+                    value, ', '.join(map(repr, self.choices))))
+        return value
+
+
+def flag_params(args, flags):
+    """ Convert the arguments described by `flags` into parameters for
+        a legacy script. `flags` is a sequence of tuples with the name
+        of the argument, the corresponding script parameter and a boolean
+        that tells if the value of the argument must be passed on as well.
+        Values are joined with their parameter into a single
+        '--param=value' string. Arguments that are not set are ignored.
+    """
+    return ['{}={}'.format(flag, getattr(args, attr)) if has_value else flag
+            for attr, flag, has_value in flags if getattr(args, attr)]
@@ -0,0 +1,63 @@
+"""
+Implementation of the 'export' subcommand.
+"""
+from .args import ChoiceType, flag_params
+
+# pylint: disable=C0111,C0415
+
+_EXPORT_TYPES = ChoiceType('continent', 'country', 'state', 'county',
+                           'city', 'suburb', 'street', 'path')
+
+_EXPORT_FLAGS = (
+    ('output_all_postcodes', '--output-all-postcodes', False),
+    ('language', '--language', True),
+    ('restrict_to_country', '--restrict-to-country', True),
+    ('restrict_to_osm_node', '--restrict-to-osm-node', True),
+    ('restrict_to_osm_way', '--restrict-to-osm-way', True),
+    ('restrict_to_osm_relation', '--restrict-to-osm-relation', True)
+)
+
+class QueryExport:
+    """\
+    Export addresses as CSV file from the database.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Output arguments')
+        group.add_argument('--output-type', default='street',
+                           type=_EXPORT_TYPES, metavar=_EXPORT_TYPES.metavar,
+                           help='Type of places to output (default: street)')
+        group.add_argument('--output-format',
+                           default='street;suburb;city;county;state;country',
+                           help="""Semicolon-separated list of address types
+                                   (see --output-type). Multiple ranks can be
+                                   merged into one column by simply using a
+                                   comma-separated list.""")
+        group.add_argument('--output-all-postcodes', action='store_true',
+                           help="""List all postcodes for address instead of
+                                   just the most likely one""")
+        group.add_argument('--language',
+                           help="""Preferred language for output
+                                   (use local name, if omitted)""")
+        group = parser.add_argument_group('Filter arguments')
+        group.add_argument('--restrict-to-country', metavar='COUNTRY_CODE',
+                           help='Export only objects within country')
+        group.add_argument('--restrict-to-osm-node', metavar='ID', type=int,
+                           help='Export only children of this OSM node')
+        group.add_argument('--restrict-to-osm-way', metavar='ID', type=int,
+                           help='Export only children of this OSM way')
+        group.add_argument('--restrict-to-osm-relation', metavar='ID', type=int,
+                           help='Export only children of this OSM relation')
+
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = ['export.php',
+                  '--output-type=' + args.output_type,
+                  '--output-format=' + args.output_format]
+        params.extend(flag_params(args, _EXPORT_FLAGS))
+
+        return exec_utils.run_legacy_script_exec(*params, nominatim_env=args)
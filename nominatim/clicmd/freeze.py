@@ -0,0 +1,27 @@
+"""
+Implementation of the 'freeze' subcommand.
+"""
+
+# pylint: disable=C0111,C0415
+
+class SetupFreeze:
+    """\
+    Make database read-only.
+
+    About half of data in the Nominatim database is kept only to be able to
+    keep the data up-to-date with new changes made in OpenStreetMap. This
+    command drops all this data and only keeps the part needed for geocoding
+    itself.
+
+    This command has the same effect as the `--no-updates` option for imports.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        pass # No options
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        return exec_utils.run_legacy_script_exec('setup.php', '--drop', nominatim_env=args)
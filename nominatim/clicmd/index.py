@@ -0,0 +1,51 @@
+"""
+Implementation of the 'index' subcommand.
+"""
+import os
+
+# pylint: disable=C0111,C0415
+
+# Number of CPUs available to the process. It does not change during the
+# lifetime of the process, so it is determined only once.
+_NUM_CPUS = (len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None) \
+            or os.cpu_count() or 1
+
+
+class UpdateIndex:
+    """\
+    Reindex all new and modified data.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Filter arguments')
+        group.add_argument('--boundaries-only', action='store_true',
+                           help="""Index only administrative boundaries.""")
+        group.add_argument('--no-boundaries', action='store_true',
+                           help="""Index everything except administrative boundaries.""")
+        group.add_argument('--minrank', '-r', type=int, metavar='RANK', default=0,
+                           help='Minimum/starting rank')
+        group.add_argument('--maxrank', '-R', type=int, metavar='RANK', default=30,
+                           help='Maximum/finishing rank')
+
+    @staticmethod
+    def run(args):
+        from ..indexer.indexer import Indexer
+
+        indexer = Indexer(args.config.get_libpq_dsn(),
+                          args.threads or _NUM_CPUS)
+
+        # The steps must run strictly one after another: indexing a place
+        # marks places of higher rank in its area for reindexing, so no
+        # rank can be started before all lower ranks and the boundaries
+        # are done. Work is parallelised within each rank, where the
+        # indexer hands out batches to whichever connection is free.
+        if not args.no_boundaries:
+            indexer.index_boundaries(args.minrank, args.maxrank)
+        if not args.boundaries_only:
+            indexer.index_by_rank(args.minrank, args.maxrank)
+
+        if not args.no_boundaries and not args.boundaries_only:
+            indexer.update_status_table()
+
+        return 0
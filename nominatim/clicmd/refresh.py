@@ -0,0 +1,77 @@
+"""
+Implementation of the 'refresh' subcommand.
+"""
+from .args import flag_params
+
+# pylint: disable=C0111,C0415
+
+_REFRESH_UPDATE_FLAGS = (
+    ('postcodes', '--calculate-postcodes', False),
+    ('word_counts', '--recompute-word-counts', False),
+    ('address_levels', '--update-address-levels', False)
+)
+
+_REFRESH_SETUP_FLAGS = (
+    ('wiki_data', '--import-wikipedia-articles', False),
+    ('website', '--setup-website', False)
+)
+
+class UpdateRefresh:
+    """\
+    Recompute auxiliary data used by the indexing process.
+
+    These functions must not be run in parallel with other update commands.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Data arguments')
+        group.add_argument('--postcodes', action='store_true',
+                           help='Update postcode centroid table')
+        group.add_argument('--word-counts', action='store_true',
+                           help='Compute frequency of full-word search terms')
+        group.add_argument('--address-levels', action='store_true',
+                           help='Reimport address level configuration')
+        group.add_argument('--functions', action='store_true',
+                           help='Update the PL/pgSQL functions in the database')
+        group.add_argument('--wiki-data', action='store_true',
+                           help='Update Wikipedia/data importance numbers.')
+        group.add_argument('--importance', action='store_true',
+                           help='Recompute place importances (expensive!)')
+        group.add_argument('--website', action='store_true',
+                           help='Refresh the directory that serves the scripts for the web API')
+        group = parser.add_argument_group('Arguments for function refresh')
+        group.add_argument('--no-diff-updates', action='store_false', dest='diffs',
+                           help='Do not enable code for propagating updates')
+        group.add_argument('--enable-debug-statements', action='store_true',
+                           help='Enable debug warning statements in functions')
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        # Functions that are handled by the same script are run with a single
+        # invocation. The scripts execute them in the order needed.
+        params = flag_params(args, _REFRESH_UPDATE_FLAGS)
+        if params:
+            exec_utils.run_legacy_script('update.php', *params,
+                                         nominatim_env=args, throw_on_fail=True)
+
+        params = []
+        if args.functions:
+            params.extend(('--create-functions', '--create-partition-functions'))
+            if args.diffs:
+                params.append('--enable-diff-updates')
+            if args.enable_debug_statements:
+                params.append('--enable-debug-statements')
+        params.extend(flag_params(args, _REFRESH_SETUP_FLAGS))
+        if params:
+            exec_utils.run_legacy_script('setup.php', *params,
+                                         nominatim_env=args, throw_on_fail=True)
+
+        # Attention: importance MUST come after wiki data import and
+        # the function update.
+        if args.importance:
+            exec_utils.run_legacy_script('update.php', '--recompute-importance',
+                                         nominatim_env=args, throw_on_fail=True)
+        return 0
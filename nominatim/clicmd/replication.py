@@ -0,0 +1,50 @@
+"""
+Implementation of the 'replication' subcommand.
+"""
+
+# pylint: disable=C0111,C0415
+
+class UpdateReplication:
+    """\
+    Update the database using an online replication service.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Arguments for initialisation')
+        group.add_argument('--init', action='store_true',
+                           help='Initialise the update process')
+        group.add_argument('--no-update-functions', dest='update_functions',
+                           action='store_false',
+                           help="""Do not update the trigger function to
+                                   support differential updates.""")
+        group = parser.add_argument_group('Arguments for updates')
+        group.add_argument('--check-for-updates', action='store_true',
+                           help='Check if new updates are available and exit')
+        group.add_argument('--once', action='store_true',
+                           help="""Download and apply updates only once. When
+                                   not set, updates are continuously applied""")
+        group.add_argument('--no-index', action='store_false', dest='do_index',
+                           help="""Do not index the new data. Only applicable
+                                   together with --once""")
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = ['update.php']
+        if args.init:
+            params.append('--init-updates')
+            if not args.update_functions:
+                params.append('--no-update-functions')
+        elif args.check_for_updates:
+            params.append('--check-for-updates')
+        else:
+            if args.once:
+                params.append('--import-osmosis')
+            else:
+                params.append('--import-osmosis-all')
+            if not args.do_index:
+                params.append('--no-index')
+
+        return exec_utils.run_legacy_script(*params, nominatim_env=args)
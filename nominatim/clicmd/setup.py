@@ -0,0 +1,70 @@
+"""
+Implementation of the 'import' subcommand.
+"""
+from .args import ChoiceType, flag_params
+
+# pylint: disable=C0111,C0415
+
+_IMPORT_STAGES = ChoiceType('load-data', 'indexing', 'db-postprocess')
+
+_SETUP_FLAGS = (
+    ('osm2pgsql_cache', '--osm2pgsql-cache', True),
+    ('reverse_only', '--reverse-only', False),
+    ('enable_debug_statements', '--enable-debug-statements', False),
+    ('no_partitions', '--no-partitions', False),
+    ('no_updates', '--drop', False),
+    ('ignore_errors', '--ignore-errors', False),
+    ('index_noanalyse', '--index-noanalyse', False)
+)
+
+class SetupAll:
+    """\
+    Create a new Nominatim database from an OSM file.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group_name = parser.add_argument_group('Required arguments')
+        group = group_name.add_mutually_exclusive_group(required=True)
+        group.add_argument('--osm-file',
+                           help='OSM file to be imported.')
+        group.add_argument('--continue', dest='continue_at',
+                           type=_IMPORT_STAGES, metavar=_IMPORT_STAGES.metavar,
+                           help='Continue an import that was interrupted')
+        group = parser.add_argument_group('Optional arguments')
+        group.add_argument('--osm2pgsql-cache', metavar='SIZE', type=int,
+                           help='Size of cache to be used by osm2pgsql (in MB)')
+        group.add_argument('--reverse-only', action='store_true',
+                           help='Do not create tables and indexes for searching')
+        group.add_argument('--enable-debug-statements', action='store_true',
+                           help='Include debug warning statements in SQL code')
+        group.add_argument('--no-partitions', action='store_true',
+                           help="""Do not partition search indices
+                                   (speeds up import of single country extracts)""")
+        group.add_argument('--no-updates', action='store_true',
+                           help="""Do not keep tables that are only needed for
+                                   updating the database later""")
+        group = parser.add_argument_group('Expert options')
+        group.add_argument('--ignore-errors', action='store_true',
+                           help='Continue import even when errors in SQL are present')
+        group.add_argument('--index-noanalyse', action='store_true',
+                           help='Do not perform analyse operations during index')
+
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        params = ['setup.php']
+        if args.osm_file:
+            params.extend(('--all', '--osm-file=' + args.osm_file))
+        else:
+            if args.continue_at == 'load-data':
+                params.append('--load-data')
+            if args.continue_at in ('load-data', 'indexing'):
+                params.append('--index')
+            params.extend(('--create-search-indices', '--create-country-names',
+                           '--setup-website'))
+        params.extend(flag_params(args, _SETUP_FLAGS))
+
+        return exec_utils.run_legacy_script(*params, nominatim_env=args)
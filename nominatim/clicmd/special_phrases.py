@@ -0,0 +1,29 @@
+"""
+Implementation of the 'special-phrases' subcommand.
+"""
+
+# pylint: disable=C0111,C0415
+
+class SetupSpecialPhrases:
+    """\
+    Maintain special phrases.
+    """
+
+    @staticmethod
+    def add_args(parser):
+        group = parser.add_argument_group('Input arguments')
+        group.add_argument('--from-wiki', action='store_true',
+                           help='Pull special phrases from the OSM wiki.')
+        group = parser.add_argument_group('Output arguments')
+        group.add_argument('-o', '--output', default='-',
+                           help="""File to write the preprocessed phrases to.
+                                   If omitted, it will be written to stdout.""")
+
+    @staticmethod
+    def run(args):
+        from ..tools import exec_utils
+
+        if args.output != '-':
+            raise NotImplementedError('Only output to stdout is currently implemented.')
+        return exec_utils.run_legacy_script('specialphrases.php', '--wiki-import',
+                                            nominatim_env=args)
@@ -29,6 +29,13 @@ class Configuration:
 
         return os.environ.get(name) or self._config[name]
 
+    def get_bool(self, name):
+        """ Return the given configuration parameter as a boolean.
+            Values of 'yes', 'true' and '1' are interpreted as true,
+            like the PHP code does.
+        """
+        return getattr(self, name).lower() in ('yes', 'true', '1')
+
     def get_libpq_dsn(self):
         """ Get configured database DSN converted into the key/value format
             understood by libpq and psycopg.
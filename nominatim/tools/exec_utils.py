@@ -1,41 +1,326 @@
 """
 Helper functions for executing external programs.
 """
+import contextlib
+import fcntl
+import hashlib
 import logging
+import os
+import signal
+import socket
+import stat
+import struct
 import subprocess
+import sys
+import tempfile
+from pathlib import Path
 from urllib.parse import urlencode
 
-def run_legacy_script(script, *args, nominatim_env=None, throw_on_fail=False):
-    """ Run a Nominatim PHP script with the given arguments.
+# FastCGI protocol constants, see https://fastcgi-archives.github.io/
+FCGI_BEGIN_REQUEST = 1
+FCGI_END_REQUEST = 3
+FCGI_PARAMS = 4
+FCGI_STDIN = 5
+FCGI_STDOUT = 6
+FCGI_STDERR = 7
+FCGI_RESPONDER = 1
 
-        Returns the exit code of the script. If `throw_on_fail` is True
-        then throw a `CalledProcessError` on a non-zero exit.
+_FCGI_HEADER = struct.Struct('!BBHHBx')
+_FCGI_MAX_CONTENT = 0xffff
+
+def _legacy_script_cmd(script, args, nominatim_env):
+    """ Return the command line and environment for running the legacy
+        PHP script `script` with the parameters `args`.
     """
     cmd = ['/usr/bin/env', 'php', '-Cq',
-           nominatim_env.phplib_dir / 'admin' / script]
-    cmd.extend([str(a) for a in args])
+           str(nominatim_env.phplib_dir / 'admin' / script)]
+    cmd.extend(args)
 
     env = nominatim_env.config.get_os_env()
     env['NOMINATIM_DATADIR'] = str(nominatim_env.data_dir)
     env['NOMINATIM_BINDIR'] = str(nominatim_env.data_dir / 'utils')
     if not env['NOMINATIM_DATABASE_MODULE_PATH']:
-        env['NOMINATIM_DATABASE_MODULE_PATH'] = nominatim_env.module_dir
+        env['NOMINATIM_DATABASE_MODULE_PATH'] = str(nominatim_env.module_dir)
     if not env['NOMINATIM_OSM2PGSQL_BINARY']:
-        env['NOMINATIM_OSM2PGSQL_BINARY'] = nominatim_env.osm2pgsql_path
+        env['NOMINATIM_OSM2PGSQL_BINARY'] = str(nominatim_env.osm2pgsql_path)
+
+    return cmd, env
+
+def run_legacy_script(script, *args, nominatim_env=None, throw_on_fail=False):
+    """ Run a Nominatim PHP script with the given arguments.
+
+        The parameters in `args` must already be strings. Parameters
+        with a value are expected in the form '--param=value'.
+
+        Returns the exit code of the script. If `throw_on_fail` is True
+        then throw a `CalledProcessError` on a non-zero exit.
+    """
+    cmd, env = _legacy_script_cmd(script, args, nominatim_env)
 
     proc = subprocess.run(cmd, cwd=str(nominatim_env.project_dir), env=env,
                           check=throw_on_fail)
 
     return proc.returncode
 
+def run_legacy_script_exec(script, *args, nominatim_env=None):
+    """ Run a Nominatim PHP script as the last step of a command.
+
+        When `nominatim_env.exec_scripts` is set, the current process is
+        replaced with the script. This saves forking the Python process.
+        The function then does not return and the exit code of the script
+        becomes the exit code of the process. Only the nominatim tool sets
+        the flag. Otherwise the script is run with `run_legacy_script()`
+        and its exit code is returned.
+    """
+    if nominatim_env.exec_scripts:
+        cmd, env = _legacy_script_cmd(script, args, nominatim_env)
+
+        logging.shutdown()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.chdir(str(nominatim_env.project_dir))
+        os.execve(cmd[0], cmd, env)
+
+    return run_legacy_script(script, *args, nominatim_env=nominatim_env)
+
+def _fcgi_record(rtype, content=b''):
+    """ Frame the given content as a FastCGI record of type `rtype`.
+    """
+    return _FCGI_HEADER.pack(1, rtype, 1, len(content), 0) + content
+
+def _fcgi_length(length):
+    if length < 128:
+        return bytes((length, ))
+    return struct.pack('!I', length | 0x80000000)
+
+def _fcgi_params(env):
+    """ Encode a dictionary of CGI variables as FastCGI name-value pairs.
+    """
+    data = bytearray()
+    for name, value in env.items():
+        name = name.encode('utf-8')
+        value = value.encode('utf-8')
+        data += _fcgi_length(len(name)) + _fcgi_length(len(value))
+        data += name + value
+
+    return bytes(data)
+
+def _fcgi_request(env):
+    """ Create the complete byte stream for a FastCGI responder request
+        with the given CGI environment and an empty request body.
+    """
+    params = _fcgi_params(env)
+    records = [_fcgi_record(FCGI_BEGIN_REQUEST,
+                            struct.pack('!HB5x', FCGI_RESPONDER, 0))]
+    records.extend(_fcgi_record(FCGI_PARAMS, params[i:i + _FCGI_MAX_CONTENT])
+                   for i in range(0, len(params), _FCGI_MAX_CONTENT))
+    records.append(_fcgi_record(FCGI_PARAMS))
+    records.append(_fcgi_record(FCGI_STDIN))
+
+    return b''.join(records)
+
+def _fcgi_read(stream, length):
+    data = stream.read(length)
+    if len(data) < length:
+        raise OSError('FastCGI connection closed unexpectedly.')
+    return data
+
+def _fcgi_response(stream):
+    """ Read FastCGI records from `stream` until the end of the request.
+        Returns a tuple of the application status, stdout and stderr.
+    """
+    output = {FCGI_STDOUT: bytearray(), FCGI_STDERR: bytearray()}
+    while True:
+        _, rtype, _, length, padding = _FCGI_HEADER.unpack(_fcgi_read(stream, _FCGI_HEADER.size))
+        content = _fcgi_read(stream, length + padding)[:length]
+        if rtype == FCGI_END_REQUEST:
+            if length < 8:
+                raise OSError('Invalid FastCGI end of request.')
+            return (struct.unpack('!I', content[:4])[0],
+                    bytes(output[FCGI_STDOUT]), bytes(output[FCGI_STDERR]))
+        if rtype in output:
+            output[rtype].extend(content)
+
+def _http_status(stdout):
+    """ Return the HTTP status code from the headers of a CGI response.
+    """
+    headers = stdout.split(b'\r\n\r\n', 1)[0]
+    for line in headers.split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'status':
+            try:
+                return int(value.split()[0])
+            except (ValueError, IndexError):
+                break
+
+    return 200
+
+def _fcgi_query(sock, env):
+    """ Execute a single request with the given CGI environment over the
+        connected FastCGI socket. Returns a tuple of exit status, stdout
+        and stderr output.
+    """
+    with sock:
+        sock.sendall(_fcgi_request(env))
+        with sock.makefile('rb') as stream:
+            return _fcgi_response(stream)
+
+class PhpCgiPool:
+    """ A php-cgi process running in FastCGI mode, which executes API
+        scripts without starting a new PHP interpreter for every call.
+
+        The process runs in the background, so that it can be shared by
+        all calls of the nominatim tool for the same project directory.
+        It is started on the first connection and stops by itself when
+        it has not been used for `idle_timeout` seconds.
+    """
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, project_dir, phpcgi_bin=None, idle_timeout=IDLE_TIMEOUT):
+        self.project_dir = str(Path(project_dir).resolve())
+        if phpcgi_bin is None:
+            self.cmd = ['/usr/bin/env', 'php-cgi']
+        else:
+            self.cmd = [str(phpcgi_bin)]
+        self.idle_timeout = idle_timeout
+
+        key = hashlib.sha256('\0'.join([self.project_dir] + self.cmd).encode('utf-8'))
+        self.socket_path = os.path.join(self._runtime_dir(), key.hexdigest()[:16] + '.sock')
+
+    @staticmethod
+    def _runtime_dir():
+        """ Return the directory for the sockets of the current user.
+            It must not be accessible for anybody else.
+        """
+        path = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                            'nominatim-{}'.format(os.getuid()))
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() \
+           or stat.S_IMODE(info.st_mode) & 0o077:
+            raise OSError('Insecure runtime directory {}.'.format(path))
+
+        return path
+
+    def _try_connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            return None
+
+        return sock
+
+    def _start(self):
+        try:
+            os.remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+        cmd = [sys.executable, str(Path(__file__).with_name('fcgi_worker.py')),
+               self.socket_path, str(self.idle_timeout)] + self.cmd
+        proc = subprocess.run(cmd, cwd=self.project_dir, start_new_session=True,
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, check=False)
+        if proc.returncode != 0:
+            raise OSError('php-cgi does not support FastCGI mode.')
+
+    def in_use(self):
+        """ Return an open file with a shared lock, which keeps the php-cgi
+            process from being stopped until it is closed. Hold it from
+            connecting until the end of the request.
+        """
+        lockfile = open(self.socket_path + '.busy', 'a', encoding='utf-8') # pylint: disable=R1732
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_SH)
+        except OSError:
+            lockfile.close()
+            raise
+
+        return lockfile
+
+    def connect(self):
+        """ Return a socket connected to the php-cgi process. The process
+            is started when it is not running yet. Callers must hold the
+            lock from `in_use()`.
+        """
+        try:
+            os.utime(self.socket_path + '.stamp')
+        except FileNotFoundError:
+            pass
+
+        sock = self._try_connect()
+        if sock is None:
+            with open(self.socket_path + '.lock', 'w', encoding='utf-8') as lockfile:
+                fcntl.flock(lockfile, fcntl.LOCK_EX)
+                # Another call may have started the process in the meantime.
+                sock = self._try_connect()
+                if sock is None:
+                    self._start()
+                    sock = self._try_connect()
+            if sock is None:
+                raise OSError('Cannot connect to php-cgi.')
+
+        return sock
+
+    def stop(self):
+        """ Stop the php-cgi process, if it is running.
+        """
+        try:
+            with open(self.socket_path + '.pid', encoding='utf-8') as pidfile:
+                os.kill(int(pidfile.read()), signal.SIGTERM)
+        except (OSError, ValueError):
+            pass
+
+def _run_phpcgi(project_dir, env, phpcgi_bin=None):
+    """ Execute a single request in a newly started php-cgi process.
+    """
+    if phpcgi_bin is None:
+        cmd = ['/usr/bin/env', 'php-cgi']
+    else:
+        cmd = [str(phpcgi_bin)]
+
+    proc = subprocess.run(cmd, cwd=str(project_dir), env=env, capture_output=True,
+                          check=False)
+
+    return proc.returncode, proc.stdout, proc.stderr
+
+def _run_fastcgi(project_dir, env, phpcgi_bin=None):
+    """ Execute a single request in the persistent php-cgi process.
+        Returns None when the process is not available.
+    """
+    with contextlib.ExitStack() as stack:
+        try:
+            pool = PhpCgiPool(project_dir, phpcgi_bin)
+            stack.enter_context(pool.in_use())
+            sock = pool.connect()
+        except OSError as exc:
+            logging.getLogger().warning("FastCGI not available (%s). Using plain php-cgi.", exc)
+            return None
+
+        try:
+            return _fcgi_query(sock, env)
+        except OSError as exc:
+            # The script might already have run, so it must not be repeated.
+            return 1, b'', 'FastCGI request failed: {}'.format(exc).encode('utf-8')
+
 def run_api_script(endpoint, project_dir, extra_env=None, phpcgi_bin=None,
-                   params=None):
+                   params=None, *, fastcgi=False):
     """ Execute a Nominiatim API function.
 
         The function needs a project directory that contains the website
         directory with the scripts to be executed. The scripts will be run
         using php_cgi. Query parameters can be added as named arguments.
 
+        With `fastcgi` set, the request is sent to a persistent php-cgi
+        process running in FastCGI mode instead (see `PhpCgiPool`). A plain
+        php-cgi is only used when that process is not available.
+
         Returns the exit code of the script.
     """
     log = logging.getLogger()
@@ -59,24 +344,25 @@ def run_api_script(endpoint, project_dir, extra_env=None, phpcgi_bin=None,
     if extra_env:
         env.update(extra_env)
 
-    if phpcgi_bin is None:
-        cmd = ['/usr/bin/env', 'php-cgi']
-    else:
-        cmd = [str(phpcgi_bin)]
+    output = _run_fastcgi(project_dir, env, phpcgi_bin) if fastcgi else None
+    if output is None:
+        output = _run_phpcgi(project_dir, env, phpcgi_bin)
 
-    proc = subprocess.run(cmd, cwd=str(project_dir), env=env, capture_output=True,
-                          check=False)
+    returncode, stdout, stderr = output
 
-    if proc.returncode != 0 or proc.stderr:
-        if proc.stderr:
-            log.error(proc.stderr.decode('utf-8').replace('\\n', '\n'))
-        else:
-            log.error(proc.stdout.decode('utf-8').replace('\\n', '\n'))
-        return proc.returncode or 1
+    # php-cgi always reports an exit status of 0 in FastCGI mode, so catch
+    # failed scripts through the HTTP status as well.
+    if returncode == 0 and _http_status(stdout) >= 500:
+        returncode = 1
 
-    result = proc.stdout.decode('utf-8')
-    content_start = result.find('\r\n\r\n')
+    if returncode != 0 or stderr:
+        if stderr:
+            log.error(stderr.decode('utf-8').replace('\\n', '\n'))
+        else:
+            log.error(stdout.decode('utf-8').replace('\\n', '\n'))
+        return returncode or 1
 
-    print(result[content_start + 4:].replace('\\n', '\n'))
+    result = stdout.decode('utf-8')
+    print(result[result.find('\r\n\r\n') + 4:].replace('\\n', '\n'))
 
     return 0
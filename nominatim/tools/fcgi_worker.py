@@ -0,0 +1,126 @@
+"""
+Supervisor for a php-cgi process running in FastCGI mode.
+
+This file is run as a standalone script by `exec_utils.PhpCgiPool` and
+must therefore not import anything from Nominatim itself:
+
+    fcgi_worker.py <socket path> <idle timeout> <php-cgi command...>
+
+The script detaches a background process that starts php-cgi bound to the
+given unix socket and stops it again once no request has been made for
+`idle timeout` seconds. Clients mark a request by touching the file
+'<socket path>.stamp'. From connecting until the end of the request, they
+hold a shared lock on '<socket path>.busy'. The supervisor only shuts
+down while it holds the lock exclusively, so that no running request is
+killed. The process ID of the supervisor is written to
+'<socket path>.pid'. The script itself exits as soon as php-cgi accepts
+connections, with a non-zero exit code when php-cgi failed to start.
+"""
+import fcntl
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+def _inode(fname):
+    try:
+        return os.stat(fname).st_ino
+    except OSError:
+        return None
+
+def _is_idle(stamp, timeout):
+    return time.time() - os.stat(stamp).st_mtime >= timeout
+
+def _cleanup(socket_path, socket_inode):
+    """ Remove the socket and the PID file, unless they already belong
+        to a newly started supervisor.
+    """
+    if socket_inode is not None and _inode(socket_path) == socket_inode:
+        os.remove(socket_path)
+    try:
+        with open(socket_path + '.pid', encoding='utf-8') as fd:
+            if fd.read() == str(os.getpid()):
+                os.remove(socket_path + '.pid')
+    except OSError:
+        pass
+
+def _serve(socket_path, timeout, cmd):
+    """ Run php-cgi until it has been idle for `timeout` seconds.
+    """
+    stamp = socket_path + '.stamp'
+    with open(stamp, 'w', encoding='utf-8'):
+        pass
+    with open(socket_path + '.pid', 'w', encoding='utf-8') as fd:
+        fd.write(str(os.getpid()))
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    socket_inode = None
+    with open(socket_path + '.busy', 'a', encoding='utf-8') as busy, \
+         subprocess.Popen(cmd + ['-b', socket_path],
+                          env={'PHP_FCGI_MAX_REQUESTS': '0'},
+                          stdin=subprocess.DEVNULL,
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL) as proc:
+        try:
+            while proc.poll() is None:
+                if socket_inode is None:
+                    socket_inode = _inode(socket_path)
+                if _is_idle(stamp, timeout):
+                    try:
+                        fcntl.flock(busy, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        pass # a request is running
+                    else:
+                        # A client might have sent a request just before.
+                        if _is_idle(stamp, timeout):
+                            break
+                        fcntl.flock(busy, fcntl.LOCK_UN)
+                try:
+                    proc.wait(min(timeout, 1))
+                except subprocess.TimeoutExpired:
+                    pass
+        finally:
+            if proc.poll() is None:
+                # Wait for running requests. Clients that come later will
+                # not find the socket anymore and start a new supervisor.
+                fcntl.flock(busy, fcntl.LOCK_EX)
+                _cleanup(socket_path, socket_inode)
+                proc.terminate()
+            else:
+                _cleanup(socket_path, socket_inode)
+
+def _accepts_connections(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+
+    return True
+
+def main(socket_path, timeout, cmd, startup_timeout=5):
+    """ Start the supervisor in the background and wait until php-cgi
+        is ready to accept requests. Returns 0 on success.
+    """
+    pid = os.fork()
+    if pid == 0:
+        os.setsid()
+        try:
+            _serve(socket_path, timeout, cmd)
+        finally:
+            os._exit(0) # pylint: disable=W0212
+
+    # The socket file already exists before php-cgi listens on it.
+    deadline = time.monotonic() + startup_timeout
+    while not _accepts_connections(socket_path):
+        if os.waitpid(pid, os.WNOHANG)[0] != 0 or time.monotonic() > deadline:
+            return 1
+        time.sleep(0.01)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], float(sys.argv[2]), sys.argv[3:]))
@@ -0,0 +1,51 @@
+<?php
+
+namespace Nominatim;
+
+require_once(CONST_LibDir.'/cmd.php');
+
+class CmdTest extends \PHPUnit\Framework\TestCase
+{
+    private $aSpec = array(
+                      'Test script',
+                      array('help', 'h', 0, 1, 0, 0, false, 'Show Help'),
+                      array('verbose', 'v', 0, 1, 0, 0, 'bool', 'Verbose output'),
+                      array('output-type', '', 0, 1, 1, 1, 'str', 'Type of output'),
+                      array('output-format', '', 0, 1, 1, 1, 'str', 'Column mapping'),
+                      array('limit', '', 0, 1, 1, 1, 'int', 'Maximum number of results')
+                     );
+
+
+    public function testGetCmdOptWithSeparateValue()
+    {
+        $aArg = array('test.php', '--output-type', 'street', '--limit', '10', '-v');
+
+        $this->assertFalse(getCmdOpt($aArg, $this->aSpec, $aResult));
+        $this->assertSame(
+            array('output-type' => 'street', 'limit' => 10, 'verbose' => true),
+            $aResult
+        );
+    }
+
+
+    public function testGetCmdOptWithEqualSign()
+    {
+        $aArg = array('test.php', '--output-type=street', '--limit=10');
+
+        $this->assertFalse(getCmdOpt($aArg, $this->aSpec, $aResult));
+        $this->assertSame(
+            array('output-type' => 'street', 'limit' => 10, 'verbose' => false),
+            $aResult
+        );
+    }
+
+
+    public function testGetCmdOptSplitsOnlyFirstEqualSign()
+    {
+        $aArg = array('test.php', '--output-format=name=ref;city', '--output-type', 'a=b');
+
+        $this->assertFalse(getCmdOpt($aArg, $this->aSpec, $aResult));
+        $this->assertSame('name=ref;city', $aResult['output-format']);
+        $this->assertSame('a=b', $aResult['output-type'], 'separate values are not split');
+    }
+}
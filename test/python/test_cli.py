@@ -1,16 +1,25 @@
 """
 Tests for command line interface wrapper.
 """
+import logging
+import os
+import sys
+from pathlib import Path
+
 import psycopg2
 import pytest
 
 import nominatim.cli
+import nominatim.indexer.indexer
+import nominatim.tools.exec_utils
+
+SRC_DIR = (Path(__file__) / '..' / '..' / '..').resolve()
 
 def call_nominatim(*args):
     return nominatim.cli.nominatim(module_dir='build/module',
                                    osm2pgsql_path='build/osm2pgsql/osm2pgsql',
                                    phplib_dir='lib',
-                                   data_dir='.',
+                                   data_dir=str(SRC_DIR),
                                    phpcgi_path='/usr/bin/php-cgi',
                                    cli_args=args)
 
@@ -28,16 +37,28 @@ class MockParamCapture:
         self.last_kwargs = kwargs
         return self.return_value
 
+@pytest.fixture(autouse=True)
+def cli_parsers(monkeypatch):
+    monkeypatch.setattr(nominatim.cli, '_PARSERS', {})
+
+@pytest.fixture
+def no_full_parser(monkeypatch):
+    def _fail(_):
+        raise AssertionError('full parser must not be used')
+
+    monkeypatch.setattr(nominatim.cli.CommandlineParser, '_build_parser', _fail)
+
 @pytest.fixture
 def mock_run_legacy(monkeypatch):
     mock = MockParamCapture()
-    monkeypatch.setattr(nominatim.cli, 'run_legacy_script', mock)
+    monkeypatch.setattr(nominatim.tools.exec_utils, 'run_legacy_script', mock)
+    monkeypatch.setattr(nominatim.tools.exec_utils, 'run_legacy_script_exec', mock)
     return mock
 
 @pytest.fixture
 def mock_run_api(monkeypatch):
     mock = MockParamCapture()
-    monkeypatch.setattr(nominatim.cli, 'run_api_script', mock)
+    monkeypatch.setattr(nominatim.tools.exec_utils, 'run_api_script', mock)
     return mock
 
 
@@ -50,6 +71,107 @@ def test_cli_help(capsys):
     assert captured.out.startswith('usage:')
 
 
+def test_cli_log_formatter_caches_time(monkeypatch):
+    fmt = ('%(asctime)s: %(message)s', '%Y-%m-%d %H:%M:%S')
+    records = [logging.makeLogRecord({'msg': 'test', 'created': created})
+               for created in (1000.1, 1000.9, 1001.2)]
+    expected = [logging.Formatter(*fmt).format(record) for record in records]
+
+    calls = []
+    strftime = nominatim.cli.time.strftime
+    monkeypatch.setattr(nominatim.cli.time, 'strftime',
+                        lambda *args: calls.append(args) or strftime(*args))
+
+    formatter = nominatim.cli._FastFormatter(*fmt)
+
+    assert [formatter.format(record) for record in records] == expected
+    # The timestamp is only formatted anew when the second changes.
+    assert len(calls) == 2
+
+
+def test_cli_known_command_skips_full_parser(no_full_parser, mock_run_legacy):
+    assert 0 == call_nominatim('warm', '--search-only')
+
+    assert mock_run_legacy.last_args == ('warm.php', '--search-only')
+
+
+def test_cli_command_help_skips_full_parser(no_full_parser, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        call_nominatim('export', '--help')
+
+    assert excinfo.value.code == 0
+    assert capsys.readouterr().out.startswith('usage: nominatim export')
+
+
+def test_cli_parser_setup_once(mock_run_legacy):
+    assert 0 == call_nominatim('warm')
+    parser = nominatim.cli._PARSERS[True]
+
+    assert 0 == call_nominatim('warm')
+    assert nominatim.cli._PARSERS == {True: parser}
+
+
+def test_cli_config_reused(mock_run_legacy):
+    assert 0 == call_nominatim('warm')
+    config = mock_run_legacy.last_kwargs['nominatim_env'].config
+
+    assert 0 == call_nominatim('warm')
+    assert mock_run_legacy.last_kwargs['nominatim_env'].config is config
+
+
+@pytest.mark.parametrize("kwargs,expected", [({}, False), ({'exec_scripts': True}, True)])
+def test_cli_exec_scripts_flag(mock_run_legacy, kwargs, expected):
+    assert 0 == nominatim.cli.nominatim(module_dir='build/module',
+                                        osm2pgsql_path='build/osm2pgsql/osm2pgsql',
+                                        phplib_dir='lib', data_dir=str(SRC_DIR),
+                                        phpcgi_path='/usr/bin/php-cgi',
+                                        cli_args=['freeze'], **kwargs)
+
+    assert mock_run_legacy.last_kwargs['nominatim_env'].exec_scripts is expected
+
+
+def test_cli_config_reloaded_on_change(monkeypatch, mock_run_legacy, tmp_path):
+    monkeypatch.delenv('NOMINATIM_DATABASE_WEBUSER', raising=False)
+    envfile = tmp_path / '.env'
+    envfile.write_text('NOMINATIM_DATABASE_WEBUSER=apache\n')
+
+    assert 0 == call_nominatim('warm', '--project-dir', str(tmp_path))
+    config = mock_run_legacy.last_kwargs['nominatim_env'].config
+    assert config.DATABASE_WEBUSER == 'apache'
+
+    envfile.write_text('NOMINATIM_DATABASE_WEBUSER=nobody\n')
+    mtime = envfile.stat().st_mtime + 10
+    os.utime(str(envfile), (mtime, mtime))
+
+    assert 0 == call_nominatim('warm', '--project-dir', str(tmp_path))
+    new_config = mock_run_legacy.last_kwargs['nominatim_env'].config
+    assert new_config is not config
+    assert new_config.DATABASE_WEBUSER == 'nobody'
+
+
+def test_cli_imports_only_called_command(monkeypatch, mock_run_legacy):
+    for module in ('nominatim.clicmd.freeze', 'nominatim.clicmd.api'):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+
+    assert 0 == call_nominatim('freeze')
+
+    assert 'nominatim.clicmd.freeze' in sys.modules
+    assert 'nominatim.clicmd.api' not in sys.modules
+
+
+def test_cli_help_skips_exec_helpers(monkeypatch):
+    for module in [m for m in sys.modules if m.startswith('nominatim.clicmd.')] \
+                  + ['nominatim.tools.exec_utils']:
+        monkeypatch.delitem(sys.modules, module)
+    monkeypatch.delattr(nominatim.tools, 'exec_utils')
+
+    with pytest.raises(SystemExit):
+        call_nominatim('--help')
+
+    assert 'nominatim.clicmd.api' in sys.modules
+    assert 'nominatim.tools.exec_utils' not in sys.modules
+
+
 @pytest.mark.parametrize("command,script", [
                          (('import', '--continue', 'load-data'), 'setup'),
                          (('freeze',), 'setup'),
@@ -68,13 +190,30 @@ def test_legacy_commands_simple(mock_run_legacy, command, script):
     assert mock_run_legacy.last_args[0] == script + '.php'
 
 
+@pytest.mark.parametrize("command,params", [
+                         (('import', '--osm-file', 'foo.pbf', '--osm2pgsql-cache', '1000',
+                           '--no-updates'),
+                          ('setup.php', '--all', '--osm-file=foo.pbf',
+                           '--osm2pgsql-cache=1000', '--drop')),
+                         (('export', '--language', 'de', '--restrict-to-osm-node', '4'),
+                          ('export.php', '--output-type=street',
+                           '--output-format=street;suburb;city;county;state;country',
+                           '--language=de', '--restrict-to-osm-node=4'))
+                         ])
+def test_legacy_commands_params(mock_run_legacy, command, params):
+    assert 0 == call_nominatim(*command)
+
+    assert mock_run_legacy.called == 1
+    assert mock_run_legacy.last_args == params
+
+
 @pytest.mark.parametrize("name,oid", [('file', 'foo.osm'), ('diff', 'foo.osc'),
                                       ('node', 12), ('way', 8), ('relation', 32)])
 def test_add_data_command(mock_run_legacy, name, oid):
     assert 0 == call_nominatim('add-data', '--' + name, str(oid))
 
     assert mock_run_legacy.called == 1
-    assert mock_run_legacy.last_args == ('update.php', '--import-' + name, oid)
+    assert mock_run_legacy.last_args == ('update.php', '--import-{}={}'.format(name, oid))
 
 
 @pytest.mark.parametrize("params,do_bnds,do_ranks", [
@@ -87,9 +226,9 @@ def test_index_command(monkeypatch, temp_db, params, do_bnds, do_ranks):
         with conn.cursor() as cur:
             cur.execute("CREATE TABLE import_status (indexed bool)")
     bnd_mock = MockParamCapture()
-    monkeypatch.setattr(nominatim.cli.Indexer, 'index_boundaries', bnd_mock)
+    monkeypatch.setattr(nominatim.indexer.indexer.Indexer, 'index_boundaries', bnd_mock)
     rank_mock = MockParamCapture()
-    monkeypatch.setattr(nominatim.cli.Indexer, 'index_by_rank', rank_mock)
+    monkeypatch.setattr(nominatim.indexer.indexer.Indexer, 'index_by_rank', rank_mock)
 
     assert 0 == call_nominatim('index', *params)
 
@@ -121,6 +260,15 @@ def test_refresh_importance_computed_after_wiki_import(mock_run_legacy):
     assert mock_run_legacy.last_args == ('update.php', '--recompute-importance')
 
 
+def test_refresh_same_script_run_once(mock_run_legacy):
+    assert 0 == call_nominatim('refresh', '--postcodes', '--word-counts',
+                               '--wiki-data', '--website')
+
+    assert mock_run_legacy.called == 2
+    assert mock_run_legacy.last_args == ('setup.php', '--import-wikipedia-articles',
+                                         '--setup-website')
+
+
 @pytest.mark.parametrize("params", [
                          ('search', '--query', 'new'),
                          ('reverse', '--lat', '0', '--lon', '0'),
@@ -136,3 +284,77 @@ def test_api_commands_simple(mock_run_api, params):
 
     assert mock_run_api.called == 1
     assert mock_run_api.last_args[0] == params[0]
+
+
+def test_api_commands_find_phpcgi(monkeypatch, mock_run_api):
+    monkeypatch.setattr(nominatim.cli, '_phpcgi', lambda: '/opt/bin/php-cgi')
+
+    assert 0 == nominatim.cli.nominatim(module_dir='build/module',
+                                        osm2pgsql_path='build/osm2pgsql/osm2pgsql',
+                                        phplib_dir='lib', data_dir=str(SRC_DIR),
+                                        phpcgi_path='', cli_args=['status'])
+
+    assert mock_run_api.last_kwargs['phpcgi_bin'] == Path('/opt/bin/php-cgi')
+
+
+def test_api_commands_fastcgi_default(monkeypatch, mock_run_api):
+    monkeypatch.delenv('NOMINATIM_FASTCGI', raising=False)
+
+    assert 0 == call_nominatim('status')
+
+    assert mock_run_api.last_kwargs['fastcgi'] is False
+
+
+def test_api_commands_fastcgi_project_setting(monkeypatch, mock_run_api, tmp_path):
+    monkeypatch.delenv('NOMINATIM_FASTCGI', raising=False)
+    (tmp_path / '.env').write_text('NOMINATIM_FASTCGI=yes\n')
+
+    assert 0 == call_nominatim('search', '--query', 'new', '--project-dir', str(tmp_path))
+
+    assert mock_run_api.last_kwargs['fastcgi'] is True
+
+
+@pytest.mark.parametrize("params,expected", [
+                         (('search', '--query', 'new', '--addressdetails',
+                           '--limit', '3', '--no-dedupe'),
+                          {'q': 'new', 'addressdetails': '1', 'format': 'jsonv2',
+                           'limit': 3, 'dedupe': '0'}),
+                         (('search', '--city', 'Berlin', '--polygon-output', 'kml',
+                           '--lang', 'de', '--bounded'),
+                          {'city': 'Berlin', 'format': 'jsonv2', 'polygon_kml': '1',
+                           'accept-language': 'de', 'bounded': '1'}),
+                         (('reverse', '--lat', '1', '--lon', '2', '--zoom', '10',
+                           '--format', 'xml', '--polygon-threshold', '0.5'),
+                          {'lat': 1.0, 'lon': 2.0, 'zoom': 10, 'format': 'xml',
+                           'polygon_threshold': 0.5}),
+                         (('lookup', '--id', 'N1', '--id', 'W2', '--extratags'),
+                          {'osm_ids': 'N1,W2', 'extratags': '1', 'format': 'jsonv2'})
+                         ])
+def test_api_commands_params(mock_run_api, params, expected):
+    assert 0 == call_nominatim(*params)
+
+    assert mock_run_api.last_kwargs['params'] == expected
+
+
+@pytest.mark.parametrize("params", [('search', '--query', 'x', '--format', 'html'),
+                                    ('status', '--format', 'xml'),
+                                    ('export', '--output-type', 'house'),
+                                    ('import', '--continue', 'load')])
+def test_commands_invalid_choice(mock_run_api, mock_run_legacy, params, capsys):
+    with pytest.raises(SystemExit):
+        call_nominatim(*params)
+
+    assert 'invalid choice' in capsys.readouterr().err
+    assert mock_run_api.called == 0
+    assert mock_run_legacy.called == 0
+
+
+@pytest.mark.parametrize("name,osmtype", [('node', 'N'), ('way', 'W'), ('relation', 'R')])
+def test_details_osm_object(mock_run_api, name, osmtype):
+    assert 0 == call_nominatim('details', '--' + name, '45', '--keywords')
+
+    params = mock_run_api.last_kwargs['params']
+    assert params['osmtype'] == osmtype
+    assert params['osmid'] == 45
+    assert params['keywords'] == '1'
+    assert params['hierarchy'] == '0'
@@ -69,3 +69,20 @@ def test_get_libpq_dsn_convert_libpq(monkeypatch):
                        'host=localhost dbname=gis password=foo')
 
     assert config.get_libpq_dsn() == 'host=localhost dbname=gis password=foo'
+
+@pytest.mark.parametrize("value,result",
+                         [(x, True) for x in ('1', 'true', 'True', 'yes', 'YES')] +
+                         [(x, False) for x in ('0', 'false', 'no', 'NO', 'x')])
+def test_get_bool(monkeypatch, value, result):
+    config = Configuration(None, DEFCFG_DIR)
+
+    monkeypatch.setenv('NOMINATIM_FASTCGI', value)
+
+    assert config.get_bool('FASTCGI') == result
+
+def test_get_bool_default(monkeypatch):
+    config = Configuration(None, DEFCFG_DIR)
+
+    monkeypatch.delenv('NOMINATIM_FASTCGI', raising=False)
+
+    assert not config.get_bool('FASTCGI')
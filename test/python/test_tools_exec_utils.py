@@ -1,9 +1,13 @@
 """
 Tests for tools.exec_utils module.
 """
+import io
 from pathlib import Path
+import socket
 import subprocess
+import sys
 import tempfile
+import time
 
 import pytest
 
@@ -26,6 +30,7 @@ def nominatim_env(tmp_phplib_dir):
         project_dir = Path('.')
         module_dir = 'module'
         osm2pgsql_path = 'osm2pgsql'
+        exec_scripts = False
 
     return _NominatimEnv
 
@@ -76,6 +81,35 @@ def test_run_legacy_do_not_overwrite_module_path(nominatim_env, test_script, mon
 
     assert 0 == exec_utils.run_legacy_script(fname, nominatim_env=nominatim_env)
 
+
+def test_run_legacy_exec_replaces_process(nominatim_env, monkeypatch):
+    nominatim_env.exec_scripts = True
+    calls = []
+    def _execve(*args):
+        calls.append(args)
+        raise SystemExit(0)
+    monkeypatch.setattr(exec_utils.os, 'chdir', calls.append)
+    monkeypatch.setattr(exec_utils.os, 'execve', _execve)
+
+    with pytest.raises(SystemExit):
+        exec_utils.run_legacy_script_exec('t.php', '--opt=3', nominatim_env=nominatim_env)
+
+    assert calls[0] == '.'
+    path, cmd, env = calls[1]
+    assert path == '/usr/bin/env'
+    assert cmd[-2:] == [str(nominatim_env.phplib_dir / 'admin' / 't.php'), '--opt=3']
+    assert env['NOMINATIM_DATABASE_MODULE_PATH'] == 'module'
+
+def test_run_legacy_exec_without_flag_returns(nominatim_env, monkeypatch):
+    calls = []
+    monkeypatch.setattr(exec_utils.os, 'execve', lambda *args: calls.append(args))
+    monkeypatch.setattr(exec_utils, 'run_legacy_script',
+                        lambda *args, **kwargs: calls.append(args) or 7)
+
+    assert 7 == exec_utils.run_legacy_script_exec('t.php', '--opt=3',
+                                                  nominatim_env=nominatim_env)
+    assert calls == [('t.php', '--opt=3')]
+
 ### run_api_script
 
 @pytest.fixture
@@ -100,3 +134,198 @@ def test_run_api_with_extra_env(tmp_project_dir):
     extra_env = dict(SCRIPT_FILENAME=str(tmp_project_dir / 'website' / 'test.php'))
     assert 0 == exec_utils.run_api_script('badname', tmp_project_dir,
                                           extra_env=extra_env)
+
+### FastCGI protocol
+
+def test_fcgi_params_encoding():
+    data = exec_utils._fcgi_params({'A': 'xyz', 'LONG': 'v' * 200})
+
+    assert data[:6] == b'\x01\x03Axyz'
+    assert data[6:15] == b'\x04\x80\x00\x00\xc8LONG'
+    assert len(data) == 15 + 200
+
+def test_fcgi_response_parsing():
+    stream = io.BytesIO(exec_utils._fcgi_record(exec_utils.FCGI_STDOUT, b'OK')
+                        + exec_utils._fcgi_record(exec_utils.FCGI_STDERR, b'warn')
+                        + exec_utils._fcgi_record(exec_utils.FCGI_END_REQUEST,
+                                                  b'\x00\x00\x00\x02\x00\x00\x00\x00'))
+
+    assert exec_utils._fcgi_response(stream) == (2, b'OK', b'warn')
+
+def test_fcgi_response_short_end_request():
+    stream = io.BytesIO(exec_utils._fcgi_record(exec_utils.FCGI_END_REQUEST, b'\x00'))
+
+    with pytest.raises(OSError):
+        exec_utils._fcgi_response(stream)
+
+def test_fcgi_response_truncated():
+    stream = io.BytesIO(exec_utils._fcgi_record(exec_utils.FCGI_STDOUT, b'OK')[:-1])
+
+    with pytest.raises(OSError):
+        exec_utils._fcgi_response(stream)
+
+@pytest.mark.parametrize("headers,status", [(b'Content-type: text/plain', 200),
+                                            (b'Status: 404 Not Found', 404),
+                                            (b'X-A: 1\r\nstatus:500', 500)])
+def test_http_status(headers, status):
+    assert exec_utils._http_status(headers + b'\r\n\r\nStatus: 400') == status
+
+### PhpCgiPool
+
+FAKE_PHPCGI = """#!{python}
+import os, socket, struct, sys, time
+
+def reply(query):
+    status = 'Status: 500 Internal Server Error\\r\\n' if 'fail' in query else ''
+    return '{{}}Content-type: text/plain\\r\\n\\r\\n{{}} {{}}'.format(status, os.getpid(), query)
+
+def read_params(data):
+    params, pos = {{}}, 0
+    while pos < len(data):
+        lengths = []
+        for _ in range(2):
+            if data[pos] < 128:
+                lengths.append(data[pos])
+                pos += 1
+            else:
+                lengths.append(struct.unpack('!I', data[pos:pos + 4])[0] & 0x7fffffff)
+                pos += 4
+        name = data[pos:pos + lengths[0]].decode()
+        params[name] = data[pos + lengths[0]:pos + sum(lengths)].decode()
+        pos += sum(lengths)
+    return params
+
+def record(rtype, content):
+    return struct.pack('!BBHHBx', 1, rtype, 1, len(content), 0) + content
+
+if len(sys.argv) < 3 or sys.argv[1] != '-b':
+    print(reply('cgi ' + os.environ['QUERY_STRING']), end='')
+    sys.exit(0)
+if {fcgi} == 0:
+    sys.exit(1)
+
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(sys.argv[2])
+# Like php-cgi, only start listening some time after creating the socket.
+time.sleep(0.2)
+server.listen(5)
+while True:
+    conn, _ = server.accept()
+    with conn, conn.makefile('rb') as stream:
+        data = b''
+        while True:
+            header = stream.read(8)
+            if len(header) < 8:
+                data = None
+                break
+            _, rtype, _, length, padding = struct.unpack('!BBHHBx', header)
+            content = stream.read(length + padding)[:length]
+            if rtype == 4:
+                data += content
+            elif rtype == 5 and not content:
+                break
+        if data is not None:
+            out = reply(read_params(data)['QUERY_STRING']).encode()
+            conn.sendall(record(6, out) + record(6, b'') + record(3, bytes(8)))
+"""
+
+@pytest.fixture
+def fcgi_env(monkeypatch):
+    """ Run the php-cgi processes from a private runtime directory
+        with a short path name, as required for unix sockets.
+    """
+    with tempfile.TemporaryDirectory() as rundir:
+        monkeypatch.setenv('XDG_RUNTIME_DIR', rundir)
+        pools = []
+
+        yield pools
+
+        for pool in pools:
+            pool.stop()
+
+@pytest.fixture(params=[1, 0], ids=['fastcgi', 'cgi-only'])
+def fake_phpcgi(request, tmp_project_dir):
+    fname = tmp_project_dir / 'php-cgi'
+    fname.write_text(FAKE_PHPCGI.format(python=sys.executable, fcgi=request.param))
+    fname.chmod(0o755)
+
+    return fname, request.param == 1
+
+def test_phpcgi_pool_reuse_process(fcgi_env, tmp_project_dir, fake_phpcgi, capsys):
+    phpcgi, has_fcgi = fake_phpcgi
+    fcgi_env.append(exec_utils.PhpCgiPool(tmp_project_dir, phpcgi))
+
+    for query in ('a', 'b'):
+        assert 0 == exec_utils.run_api_script('test', tmp_project_dir, phpcgi_bin=phpcgi,
+                                              params={'q': query}, fastcgi=True)
+
+    first, second = capsys.readouterr().out.splitlines()
+    if has_fcgi:
+        assert first.split()[0] == second.split()[0]
+        assert first.split()[1:] == ['q=a']
+    else:
+        # Falls back to plain php-cgi.
+        assert first.split()[0] != second.split()[0]
+        assert first.split()[1:] == ['cgi', 'q=a']
+
+def test_phpcgi_pool_no_fastcgi_by_default(fcgi_env, tmp_project_dir, fake_phpcgi, capsys):
+    phpcgi, _ = fake_phpcgi
+
+    assert 0 == exec_utils.run_api_script('test', tmp_project_dir, phpcgi_bin=phpcgi,
+                                          params={'q': 'a'})
+
+    assert capsys.readouterr().out.split()[1:] == ['cgi', 'q=a']
+    assert not Path(exec_utils.PhpCgiPool(tmp_project_dir, phpcgi).socket_path).exists()
+
+def test_phpcgi_pool_script_failure(fcgi_env, tmp_project_dir, fake_phpcgi):
+    phpcgi, _ = fake_phpcgi
+    fcgi_env.append(exec_utils.PhpCgiPool(tmp_project_dir, phpcgi))
+
+    assert 1 == exec_utils.run_api_script('test', tmp_project_dir, phpcgi_bin=phpcgi,
+                                          params={'q': 'fail'}, fastcgi=True)
+
+def test_phpcgi_pool_failed_request_not_repeated(fcgi_env, tmp_project_dir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(exec_utils.PhpCgiPool, 'connect', lambda self: socket.socket())
+    monkeypatch.setattr(exec_utils, '_run_phpcgi', lambda *args: calls.append(args))
+
+    assert 1 == exec_utils.run_api_script('test', tmp_project_dir, fastcgi=True)
+    assert not calls
+
+def test_phpcgi_pool_idle_stop(fcgi_env, tmp_project_dir, fake_phpcgi):
+    phpcgi, has_fcgi = fake_phpcgi
+    if not has_fcgi:
+        pytest.skip('needs FastCGI')
+    pool = exec_utils.PhpCgiPool(tmp_project_dir, phpcgi, idle_timeout=0.2)
+    fcgi_env.append(pool)
+
+    with pool.in_use():
+        pool.connect().close()
+    assert Path(pool.socket_path).exists()
+
+    for _ in range(100):
+        if not Path(pool.socket_path).exists():
+            break
+        time.sleep(0.05)
+    else:
+        assert False, 'php-cgi was not stopped'
+
+def test_phpcgi_pool_not_stopped_during_request(fcgi_env, tmp_project_dir, fake_phpcgi):
+    phpcgi, has_fcgi = fake_phpcgi
+    if not has_fcgi:
+        pytest.skip('needs FastCGI')
+    pool = exec_utils.PhpCgiPool(tmp_project_dir, phpcgi, idle_timeout=0.2)
+    fcgi_env.append(pool)
+
+    with pool.in_use():
+        sock = pool.connect()
+        time.sleep(1)
+
+        assert exec_utils._fcgi_query(sock, {'QUERY_STRING': 'q=a'})[0] == 0
+
+    for _ in range(100):
+        if not Path(pool.socket_path).exists():
+            break
+        time.sleep(0.05)
+    else:
+        assert False, 'php-cgi was not stopped'